@@ -1,119 +1,437 @@
 import streamlit as st
 import tempfile
+import asyncio
+import threading
+import time
 import re
 import shutil
+import subprocess
 import os
+import sys
+import hashlib
+from bisect import bisect_right
+from concurrent.futures import wait
+from io import BytesIO
+import aiofiles
 
 # IMPORTANT: st.set_page_config MUSS als erstes kommen!
 st.set_page_config(page_title="Maxis Hörbuchmaker: Text zu Sprache", page_icon="🔊", layout="centered")
 
-# Versuch, system-weites ffmpeg (und ffprobe) zu nutzen
-from pydub import AudioSegment
-system_ffmpeg = shutil.which("ffmpeg")
-system_ffprobe = shutil.which("ffprobe")
-if system_ffmpeg and system_ffprobe:
-    AudioSegment.converter = system_ffmpeg
-    AudioSegment.ffprobe = system_ffprobe
-else:
-    # Falls kein system-weites ffmpeg gefunden wurde, versuche imageio-ffmpeg zu nutzen
-    try:
-        import imageio_ffmpeg
-        ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-        AudioSegment.converter = ffmpeg_path
-        # Versuche, den ffprobe-Pfad aus dem ffmpeg-Pfad abzuleiten
-        ffprobe_candidate = ffmpeg_path.replace("ffmpeg", "ffprobe")
-        if os.path.exists(ffprobe_candidate):
-            AudioSegment.ffprobe = ffprobe_candidate
-        else:
-            st.error("ffprobe wurde nicht gefunden. Bitte stellen Sie sicher, dass ffmpeg (inklusive ffprobe) installiert ist.")
-    except ImportError:
-        st.error("ffmpeg wurde nicht gefunden. Bitte installieren Sie ffmpeg oder fügen Sie es dem PATH hinzu.")
+@st.cache_resource
+def get_ffmpeg_paths():
+    """
+    Ermittelt einmalig die Pfade zu ffmpeg und ffprobe. Nutzt bevorzugt die system-weiten
+    Programme und fällt sonst auf imageio-ffmpeg zurück. Fehlende Programme ergeben None.
+    """
+    ffmpeg_path = shutil.which("ffmpeg")
+    ffprobe_path = shutil.which("ffprobe")
+    if not (ffmpeg_path and ffprobe_path):
+        # Falls kein system-weites ffmpeg gefunden wurde, versuche imageio-ffmpeg zu nutzen
+        try:
+            import imageio_ffmpeg
+            ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+            # Versuche, den ffprobe-Pfad aus dem ffmpeg-Pfad abzuleiten
+            ffprobe_candidate = ffmpeg_path.replace("ffmpeg", "ffprobe")
+            if os.path.exists(ffprobe_candidate):
+                ffprobe_path = ffprobe_candidate
+        except ImportError:
+            pass
+    return ffmpeg_path, ffprobe_path
 
-from openai import OpenAI
+FFMPEG_PATH, FFPROBE_PATH = get_ffmpeg_paths()
+if not FFMPEG_PATH:
+    st.error("ffmpeg wurde nicht gefunden. Bitte installieren Sie ffmpeg oder fügen Sie es dem PATH hinzu.")
+elif not FFPROBE_PATH:
+    st.error("ffprobe wurde nicht gefunden. Bitte stellen Sie sicher, dass ffmpeg (inklusive ffprobe) installiert ist.")
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+@st.cache_resource
+def get_event_loop():
+    """
+    Dauerhaft laufende Event-Loop in einem eigenen Thread. Alle asynchronen Umwandlungen laufen hier,
+    damit der zwischengespeicherte OpenAI-Client immer an dieselbe Loop gebunden bleibt.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="tts-event-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource
+def get_client():
+    """
+    Erzeugt den (asynchronen) OpenAI-Client einmalig für alle Reruns und Sitzungen. HTTP/2 bündelt die
+    vielen Chunk-Anfragen auf wenigen TLS-Verbindungen, der Pool hält Verbindungen zwischen den Anfragen offen.
+    """
+    # Zugriff auf den API-Schlüssel aus den Streamlit-Secrets
+    return AsyncOpenAI(
+        api_key=st.secrets["openai"]["api_key"],
+        http_client=DefaultAsyncHttpxClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+    )
 
-# OpenAI API-Schlüssel Setup
-# Zugriff auf den API-Schlüssel aus den Streamlit-Secrets
-OPENAI_API_KEY = st.secrets["openai"]["api_key"]
-# Initialisiere den OpenAI-Client
-client = OpenAI(api_key=OPENAI_API_KEY)
+event_loop = get_event_loop()
+client = get_client()
 
 MAX_CHARS = 4096  # Maximale Zeichen pro Anfrage (hidden Limit des TTS-Modells)
+MAX_CONCURRENT_REQUESTS = 8  # Maximal gleichzeitige TTS-Anfragen (an die Rate-Limits von OpenAI anpassen)
+STREAM_CHUNK_SIZE = 64 * 1024  # Blockgröße beim Empfangen der Audio-Daten
+TTS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "hoerbuchmaker", "tts")  # Cache für bereits erzeugte Chunks
+TTS_CACHE_MAX_ENTRIES = 5000  # Maximale Anzahl zwischengespeicherter Chunks
+PDF_CACHE_MAX_ENTRIES = 100  # Maximale Anzahl zwischengespeicherter PDF-Texte
+PDF_CACHE_TTL = 24 * 60 * 60  # Sekunden, die ein extrahierter PDF-Text zwischengespeichert bleibt
+ESTIMATE_CACHE_MAX_ENTRIES = 100  # Maximale Anzahl zwischengespeicherter Kosten-/Dauer-Schätzungen
+ESTIMATE_CACHE_TTL = 24 * 60 * 60  # Sekunden, die eine Schätzung zwischengespeichert bleibt
+MAX_CONVERSION_JOBS = 4  # Maximal gleichzeitig laufende Umwandlungen (über alle Sitzungen)
+PROGRESS_INTERVAL = 0.1  # Sekunden zwischen zwei Fortschrittsabfragen einer laufenden Umwandlung
+PROGRESS_HEARTBEAT = 1.0  # Spätestens nach so vielen Sekunden wird der Fortschritt erneut gesendet
+
+# Einmalig kompilierte reguläre Ausdrücke
+WHITESPACE_RE = re.compile(r'(\s+)')
+SINGLE_LINE_BREAK_RE = re.compile(r'(?<!\n)\n(?!\n)')
+WORD_RE = re.compile(r'\S+')
+SENTENCE_END_RE = re.compile(r'[.!?]["\'»«“”)]*(\s+)')
 
-def text_to_speech(text, voice, model):
+async def text_to_speech(text, voice, model):
     """
-    Wandelt einen Text in Sprache um und speichert das Audio in einer temporären MP3-Datei.
+    Wandelt einen Text in Sprache um und gibt das Audio als MP3-Bytes zurück.
     Gibt im Fehlerfall einen String zurück, der mit "Error:" beginnt.
     """
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio_file:
-            temp_file = temp_audio_file.name
-            response = client.audio.speech.create(
-                model=model,
-                voice=voice,
-                input=text
-            )
-            response.stream_to_file(temp_file)
-        if not os.path.exists(temp_file):
-            return "Error: Temporäre Audio-Datei wurde nicht erstellt: " + temp_file
-        return temp_file
+        buffer = BytesIO()
+        async with client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text
+        ) as response:
+            async for data in response.iter_bytes(chunk_size=STREAM_CHUNK_SIZE):
+                buffer.write(data)
+        return buffer.getvalue()
     except Exception as e:
         return "Error: " + str(e)
 
+def tts_cache_path(text, voice, model):
+    """
+    Pfad der Cache-Datei für ein TTS-Ergebnis, abgeleitet aus Modell, Stimme und SHA-256 des Textes.
+    """
+    key = hashlib.sha256(f"{model}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+    return os.path.join(TTS_CACHE_DIR, key + ".mp3")
+
+async def cached_text_to_speech(text, voice, model):
+    """
+    Wie text_to_speech, liefert aber bereits erzeugte Audios aus dem Festplatten-Cache,
+    damit unveränderte Chunks bei einer erneuten Umwandlung weder Zeit noch Geld kosten.
+    """
+    cache_path = tts_cache_path(text, voice, model)
+    try:
+        async with aiofiles.open(cache_path, "rb") as f:
+            cached = await f.read()
+    except OSError:
+        cached = None
+    if cached is not None:
+        try:
+            # Zuletzt genutzte Einträge bleiben beim Aufräumen erhalten
+            await asyncio.to_thread(os.utime, cache_path)
+        except OSError:
+            pass
+        return cached
+    result = await text_to_speech(text, voice, model)
+    if not isinstance(result, str):
+        await asyncio.to_thread(store_tts_cache, cache_path, result)
+    return result
+
+def store_tts_cache(cache_path, audio_bytes):
+    """
+    Legt ein TTS-Ergebnis im Cache ab. Läuft außerhalb der Event-Loop, da alle Aufrufe blockieren.
+    Fehler beim Schreiben werden ignoriert, der Chunk wird dann beim nächsten Mal neu erzeugt.
+    """
+    temp_path = None
+    try:
+        os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+        # Erst in eine eindeutige temporäre Datei schreiben, damit nie eine halbe Cache-Datei gelesen wird
+        temp_fd, temp_path = tempfile.mkstemp(dir=TTS_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(temp_fd, "wb") as f:
+            f.write(audio_bytes)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def prune_tts_cache(max_entries=TTS_CACHE_MAX_ENTRIES):
+    """
+    Löscht die ältesten Einträge des TTS-Caches, sobald er mehr als max_entries Dateien enthält.
+    """
+    try:
+        entries = [entry for entry in os.scandir(TTS_CACHE_DIR) if entry.name.endswith(".mp3")]
+    except OSError:
+        return
+    if len(entries) <= max_entries:
+        return
+    dated_entries = []
+    for entry in entries:
+        try:
+            dated_entries.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            pass  # Inzwischen von einem parallelen Aufräumen gelöscht
+    dated_entries.sort()
+    for _, path in dated_entries[:len(dated_entries) - max_entries]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
 def chunk_text(text, max_length=MAX_CHARS):
     """
     Zerlegt den Text in Stücke mit höchstens max_length Zeichen, behält dabei alle Whitespace-Zeichen.
+    Jedes Stück wird mit möglichst vielen ganzen Sätzen gefüllt, sofern es dabei mindestens zur Hälfte
+    gefüllt wird. Sonst wird vor dem letzten Whitespace geschnitten; Wörter, die länger als max_length
+    sind, werden hart getrennt. Läuft in linearer Zeit über den Text.
     """
-    tokens = re.split(r'(\s+)', text)
+    sentence_ends = [match.start(1) for match in SENTENCE_END_RE.finditer(text)]
+    whitespace_starts = [match.start() for match in WHITESPACE_RE.finditer(text)]
     chunks = []
-    current_chunk = ""
-    for token in tokens:
-        if len(current_chunk) + len(token) <= max_length:
-            current_chunk += token
-        else:
-            chunks.append(current_chunk)
-            current_chunk = token
-    if current_chunk:
-        chunks.append(current_chunk)
+    start = 0
+    while len(text) - start > max_length:
+        end = start + max_length
+        # Ein Satzende zählt nur, wenn das Stück dadurch mindestens halb voll wird; so erzeugen
+        # frühe (oder falsche) Satzenden wie "1. Kapitel" oder "z. B." keine kurzen Zusatzanfragen
+        min_sentence_cut = start + max_length // 2
+        cut = end
+        for boundaries, min_cut in ((sentence_ends, min_sentence_cut), (whitespace_starts, start + 1)):
+            i = bisect_right(boundaries, end) - 1
+            if i >= 0 and boundaries[i] >= min_cut:
+                cut = boundaries[i]
+                break
+        chunks.append(text[start:cut])
+        start = cut
+    if start < len(text):
+        chunks.append(text[start:])
     return chunks
 
-def convert_text_to_speech(text, voice, model):
+async def synthesize_chunks(chunks, voice, model, on_chunk_done=None):
+    """
+    Erzeugt die Audios aller Chunks nebenläufig, begrenzt durch MAX_CONCURRENT_REQUESTS.
+    Identische Chunks werden nur einmal angefragt.
+    Gibt die Ergebnisse von cached_text_to_speech in der Reihenfolge der Chunks zurück.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    chunk_counts = {}
+    for chunk in chunks:
+        chunk_counts[chunk] = chunk_counts.get(chunk, 0) + 1
+
+    async def bound_tts(chunk):
+        async with semaphore:
+            result = await cached_text_to_speech(chunk, voice, model)
+        if on_chunk_done is not None:
+            for _ in range(chunk_counts[chunk]):
+                on_chunk_done()
+        return result
+
+    unique_chunks = list(chunk_counts)
+    results = await asyncio.gather(*(bound_tts(chunk) for chunk in unique_chunks))
+    results_by_chunk = dict(zip(unique_chunks, results))
+    return [results_by_chunk[chunk] for chunk in chunks]
+
+class ConversionProgress:
+    """
+    Threadsicherer Fortschritt einer Umwandlung, die im Hintergrund läuft.
+    Wird auf der Event-Loop aktualisiert und von der UI bei jedem Rerun ausgelesen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._total = 1
+        self._message = "Starte Umwandlung..."
+
+    def start(self, total, message):
+        with self._lock:
+            self._completed = 0
+            self._total = total
+            self._message = message
+
+    def advance(self):
+        with self._lock:
+            self._completed += 1
+            self._message = f"{self._completed} von {self._total} Chunks verarbeitet..."
+
+    def set_message(self, message):
+        with self._lock:
+            self._message = message
+
+    def snapshot(self):
+        """
+        Gibt (Anteil abgeschlossen zwischen 0 und 1, Statusmeldung) zurück.
+        """
+        with self._lock:
+            return self._completed / self._total, self._message
+
+@st.cache_resource
+def get_conversion_slots():
+    """
+    Semaphore auf der gemeinsamen Event-Loop, die die gleichzeitig laufenden Umwandlungen
+    (über alle Sitzungen) auf MAX_CONVERSION_JOBS begrenzt.
+    """
+    async def create_semaphore():
+        return asyncio.Semaphore(MAX_CONVERSION_JOBS)
+
+    return asyncio.run_coroutine_threadsafe(create_semaphore(), event_loop).result()
+
+def convert_text_to_speech(text, voice, model, progress):
     """
-    Teilt den Text in Chunks, falls er zu lang ist, und fügt die resultierenden Audios zusammen.
-    Zeigt dabei einen Fortschrittsbalken und Statusmeldungen an.
+    Startet die Umwandlung auf der gemeinsamen Event-Loop und gibt sofort ein concurrent.futures.Future
+    zurück. Dessen Ergebnis sind die MP3-Bytes oder ein String, der mit "Error:" beginnt.
+    Der Fortschritt wird über progress (ConversionProgress) gemeldet; sind bereits MAX_CONVERSION_JOBS
+    Umwandlungen aktiv, wartet der Auftrag auf einen freien Platz.
+    """
+    conversion_slots = get_conversion_slots()
+
+    async def run_conversion():
+        async with conversion_slots:
+            return await synthesize_text(text, voice, model, progress)
+
+    return asyncio.run_coroutine_threadsafe(run_conversion(), event_loop)
+
+async def synthesize_text(text, voice, model, progress):
+    """
+    Asynchrone Umsetzung von convert_text_to_speech: TTS-Anfragen und Zusammenfügen per ffmpeg
+    blockieren die Event-Loop nicht. Gibt die fertigen MP3-Bytes zurück.
     """
     if len(text) <= MAX_CHARS:
-        return text_to_speech(text, voice, model)
+        progress.start(1, "Verarbeite Text...")
+        result = await cached_text_to_speech(text, voice, model)
+        if isinstance(result, str):
+            return result
+        progress.advance()
+        audio_bytes = result
     else:
-        chunks = chunk_text(text)
-        combined_audio = None
-        progress_bar = st.progress(0)
-        status = st.empty()
-        total = len(chunks)
-        for i, chunk in enumerate(chunks):
-            status.text(f"Verarbeite Chunk {i+1} von {total}...")
-            audio_path = text_to_speech(chunk, voice, model)
-            if audio_path.startswith("Error:"):
-                st.error(f"Fehler bei Chunk {i+1}: {audio_path}")
-                return audio_path
-            if not os.path.exists(audio_path):
-                st.error(f"Audio-Datei für Chunk {i+1} nicht gefunden: {audio_path}")
-                return f"Error: Audio-Datei für Chunk {i+1} nicht gefunden"
+        # Das Zerlegen eines ganzen Buchs dauert spürbar und soll die gemeinsame Loop nicht aufhalten
+        chunks = await asyncio.to_thread(chunk_text, text)
+        progress.start(len(chunks), f"Verarbeite {len(chunks)} Chunks...")
+        segments = await synthesize_chunks(chunks, voice, model, progress.advance)
+        for i, segment in enumerate(segments):
+            if isinstance(segment, str):
+                return f"Error: Fehler bei Chunk {i+1}: {segment}"
+        progress.set_message("Alle Chunks verarbeitet, kombiniere Audio...")
+        try:
+            audio_bytes = await concat_mp3_segments(segments)
+        except (OSError, subprocess.CalledProcessError):
+            # Fallback: Chunks dekodieren und mit pydub neu kodieren
             try:
-                segment = AudioSegment.from_mp3(audio_path)
+                audio_bytes = await asyncio.to_thread(concat_mp3_segments_pydub, segments)
             except Exception as ex:
-                st.error(f"Fehler beim Laden von Chunk {i+1}: {ex}")
-                return f"Error: Fehler beim Laden von Chunk {i+1}: {ex}"
-            if combined_audio is None:
-                combined_audio = segment
-            else:
-                combined_audio += segment
-            progress_bar.progress((i+1)/total)
-        status.text("Alle Chunks verarbeitet, kombiniere Audio...")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as out_file:
-            combined_audio.export(out_file.name, format="mp3")
-            status.text("Audio-Kombination abgeschlossen.")
-            return out_file.name
+                return f"Error: Fehler beim Kombinieren der Chunks: {ex}"
+        progress.set_message("Audio-Kombination abgeschlossen.")
+    # Den Cache erst aufräumen, wenn das Ergebnis feststeht; ein Fehler dabei darf die
+    # bereits bezahlte Umwandlung nicht scheitern lassen
+    try:
+        await asyncio.to_thread(prune_tts_cache)
+    except Exception:
+        pass
+    return audio_bytes
+
+async def concat_mp3_segments(segments):
+    """
+    Fügt MP3-Daten zusammen, indem sie hintereinander über stdin an ffmpeg übergeben werden,
+    und gibt das Ergebnis als Bytes zurück.
+    Die MP3-Frames werden nur kopiert (-c copy), es findet keine Dekodierung oder Neukodierung statt.
+    """
+    if not FFMPEG_PATH:
+        raise FileNotFoundError("ffmpeg wurde nicht gefunden")
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_PATH, "-loglevel", "error",
+        "-f", "mp3", "-i", "pipe:0",
+        "-c", "copy", "-f", "mp3", "pipe:1",
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    audio_bytes, stderr = await process.communicate(b"".join(segments))
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, FFMPEG_PATH, audio_bytes, stderr)
+    return audio_bytes
+
+def concat_mp3_segments_pydub(segments):
+    """
+    Fallback für concat_mp3_segments: dekodiert alle MP3-Daten mit pydub und kodiert das Ergebnis neu.
+    Die PCM-Daten werden in einen einmalig vorab allokierten Puffer kopiert statt per
+    AudioSegment += angehängt, was bei jedem Chunk das gesamte bisherige Audio kopieren würde.
+    pydub wird erst hier importiert, da es im Normalfall nicht gebraucht wird.
+    """
+    from pydub import AudioSegment
+    if FFMPEG_PATH:
+        AudioSegment.converter = FFMPEG_PATH
+    if FFPROBE_PATH:
+        AudioSegment.ffprobe = FFPROBE_PATH
+    decoded = [AudioSegment.from_file(BytesIO(data), format="mp3") for data in segments]
+    first = decoded[0]
+    # Alle Segmente auf das Format des ersten Segments bringen
+    decoded = [
+        seg.set_frame_rate(first.frame_rate).set_channels(first.channels).set_sample_width(first.sample_width)
+        for seg in decoded
+    ]
+    raw_segments = [seg.raw_data for seg in decoded]
+    # Jedes Segment wird genau einmal kopiert (O(N)); auch ein paarweises Zusammenfügen
+    # per AudioSegment + (O(N log N)) würde jede Stufe erneut kopieren.
+    buffer = bytearray(sum(len(raw) for raw in raw_segments))
+    view = memoryview(buffer)
+    offset = 0
+    for raw in raw_segments:
+        view[offset:offset + len(raw)] = raw
+        offset += len(raw)
+    combined_audio = AudioSegment(
+        data=bytes(buffer),
+        sample_width=first.sample_width,
+        frame_rate=first.frame_rate,
+        channels=first.channels
+    )
+    out_buffer = BytesIO()
+    combined_audio.export(out_buffer, format="mp3")
+    return out_buffer.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=PDF_CACHE_MAX_ENTRIES, ttl=PDF_CACHE_TTL)
+def extract_pdf_text(file_hash, _data):
+    """
+    Extrahiert den Text aller Seiten einer PDF. Das Ergebnis wird über den MD5-Hash der
+    Datei (begrenzt) zwischengespeichert, damit Reruns die PDF nicht erneut parsen.
+    Nutzt pypdfium2 (PDFium, nativ) und fällt auf PyPDF2 zurück, falls es nicht installiert ist.
+    """
+    try:
+        import pypdfium2
+    except ImportError:
+        return extract_pdf_text_pypdf2(_data)
+    pdf = pypdfium2.PdfDocument(_data)
+    try:
+        page_texts = []
+        for page in pdf:
+            text_page = page.get_textpage()
+            page_texts.append(text_page.get_text_range().replace("\r\n", "\n") + "\n")
+            text_page.close()
+            page.close()
+        return "".join(page_texts)
+    finally:
+        pdf.close()
 
+def extract_pdf_text_pypdf2(data):
+    """
+    Extrahiert den Text aller Seiten einer PDF mit PyPDF2 (reines Python, langsamer).
+    Läuft in einem eigenen Python-Prozess (pdf_extract), der die Seiten parallel verarbeitet.
+    """
+    result = subprocess.run(
+        [sys.executable, "-m", "pdf_extract"],
+        input=data,
+        capture_output=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        # Nur die letzte Zeile des Tracebacks (die eigentliche Fehlermeldung) anzeigen
+        error_lines = result.stderr.decode("utf-8", errors="replace").strip().splitlines()
+        raise RuntimeError(error_lines[-1] if error_lines else f"pdf_extract beendet mit Code {result.returncode}")
+    return result.stdout.decode("utf-8")
+
+@st.cache_data(show_spinner=False, max_entries=ESTIMATE_CACHE_MAX_ENTRIES, ttl=ESTIMATE_CACHE_TTL)
 def estimate_price_and_duration(text, rate_per_million):
     """
     Schätzt Kosten und Dauer basierend auf der Zeichenanzahl.
@@ -121,7 +439,7 @@ def estimate_price_and_duration(text, rate_per_million):
     """
     char_count = len(text)
     estimated_cost = (char_count / 1_000_000) * rate_per_million
-    word_count = len(text.split())
+    word_count = sum(1 for _ in WORD_RE.finditer(text))
     estimated_seconds = word_count * 0.4
     return estimated_cost, estimated_seconds
 
@@ -141,7 +459,7 @@ def fix_line_breaks(text):
     Ersetzt einfache Zeilenumbrüche innerhalb eines Absatzes durch Leerzeichen,
     lässt aber doppelte Zeilenumbrüche als Absatztrenner.
     """
-    return re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
+    return SINGLE_LINE_BREAK_RE.sub(' ', text)
 
 def correct_direct_text():
     st.session_state.text_input = fix_line_breaks(st.session_state.text_input)
@@ -149,6 +467,81 @@ def correct_direct_text():
 def correct_file_text():
     st.session_state.file_text = fix_line_breaks(st.session_state.file_text)
 
+def read_uploaded_file(uploaded_file):
+    """
+    Liest die hochgeladene Datei einmalig ein und merkt sich Bytes und MD5-Hash in der Sitzung,
+    damit Reruns weder die Datei erneut lesen noch den Hash neu berechnen.
+    Gibt (Bytes, MD5-Hash) zurück.
+    """
+    upload = st.session_state.get("upload")
+    if upload is None or upload["file_id"] != uploaded_file.file_id:
+        data = uploaded_file.getvalue()
+        upload = {"file_id": uploaded_file.file_id, "data": data, "md5": hashlib.md5(data).hexdigest()}
+        st.session_state.upload = upload
+    return upload["data"], upload["md5"]
+
+def start_conversion(source, text, voice, model):
+    """
+    Startet die Umwandlung im Hintergrund und merkt sich den Auftrag in der Sitzung.
+    source kennzeichnet den UI-Bereich, in dem Fortschritt und Ergebnis angezeigt werden.
+    """
+    progress = ConversionProgress()
+    future = convert_text_to_speech(text, voice, model, progress)
+    st.session_state.job = {"source": source, "future": future, "progress": progress}
+
+def conversion_running():
+    job = st.session_state.get("job")
+    return job is not None and not job["future"].done()
+
+def render_conversion(source):
+    """
+    Zeigt Fortschritt bzw. Ergebnis des aktuellen Auftrags an, falls er aus dem Bereich source stammt.
+    Läuft der Auftrag noch, wird der Platzhalter des Fortschrittsbalkens zurückgegeben, sonst None.
+    """
+    job = st.session_state.get("job")
+    if job is None or job["source"] != source:
+        return None
+    if not job["future"].done():
+        fraction, message = job["progress"].snapshot()
+        placeholder = st.empty()
+        placeholder.progress(fraction, text=message)
+        return placeholder
+    try:
+        result = job["future"].result()
+    except Exception as e:
+        result = f"Error: {e}"
+    if isinstance(result, str):
+        st.error(f"Ein Fehler ist aufgetreten: {result}")
+    else:
+        st.success("Umwandlung abgeschlossen!")
+        # Die MP3-Bytes liegen bereits im Ergebnis des Auftrags und werden für Player und Download wiederverwendet
+        st.audio(result, format="audio/mp3")
+        st.download_button(
+            label="Audio-Datei herunterladen",
+            data=result,
+            file_name="tts_output.mp3",
+            mime="audio/mp3"
+        )
+    return None
+
+def follow_conversion(placeholder):
+    """
+    Wartet auf den laufenden Auftrag und aktualisiert dabei nur den Fortschrittsbalken in placeholder.
+    Gesendet wird nur bei geändertem Fortschritt (höchstens alle PROGRESS_INTERVAL Sekunden) und
+    spätestens nach PROGRESS_HEARTBEAT Sekunden, damit Eingaben den Skriptlauf weiterhin unterbrechen können.
+    """
+    job = st.session_state.job
+    last_snapshot = job["progress"].snapshot()
+    last_update = time.monotonic()
+    while not wait([job["future"]], timeout=PROGRESS_INTERVAL).done:
+        snapshot = job["progress"].snapshot()
+        now = time.monotonic()
+        if snapshot != last_snapshot or now - last_update >= PROGRESS_HEARTBEAT:
+            fraction, message = snapshot
+            placeholder.progress(fraction, text=message)
+            last_snapshot = snapshot
+            last_update = now
+
 # --- Layout & UI ---
 
 # Keine Debug-Ausgaben hier – alle Hinweise erscheinen nur in Fehlerfällen.
@@ -196,28 +589,17 @@ st.subheader("Direkte Texteingabe")
 st.text_area("Geben Sie den Text ein, den Sie umwandeln möchten:", key="text_input", height=150)
 st.button("Zeilenumbrüche korrigieren", on_click=correct_direct_text)
 
-if st.button("Text in Sprache umwandeln"):
+if st.button("Text in Sprache umwandeln", disabled=conversion_running()):
     if st.session_state.text_input.strip() == "":
         st.warning("Bitte geben Sie einen Text ein.")
     else:
-        with st.spinner("Wandle Text in Sprache um..."):
-            audio_file_path = convert_text_to_speech(
-                st.session_state.text_input,
-                voices[selected_voice],
-                modelle[selected_model]["model"]
-            )
-        if isinstance(audio_file_path, str) and audio_file_path.startswith("Error:"):
-            st.error(f"Ein Fehler ist aufgetreten: {audio_file_path}")
-        else:
-            st.success("Umwandlung abgeschlossen!")
-            st.audio(audio_file_path, format="audio/mp3")
-            with open(audio_file_path, "rb") as file:
-                st.download_button(
-                    label="Audio-Datei herunterladen",
-                    data=file,
-                    file_name="tts_output.mp3",
-                    mime="audio/mp3"
-                )
+        start_conversion(
+            "direct",
+            st.session_state.text_input,
+            voices[selected_voice],
+            modelle[selected_model]["model"]
+        )
+progress_placeholder = render_conversion("direct")
 
 st.markdown("---")
 st.subheader("Datei Upload und Bearbeitung")
@@ -226,21 +608,16 @@ if uploaded_file is not None:
     file_details = {"Dateiname": uploaded_file.name, "Dateityp": uploaded_file.type, "Größe": uploaded_file.size}
     st.write(file_details)
     extracted_text = ""
+    file_data, file_hash = read_uploaded_file(uploaded_file)
     if uploaded_file.type == "application/pdf":
         try:
-            import PyPDF2
-            pdf_reader = PyPDF2.PdfReader(uploaded_file)
-            for page in pdf_reader.pages:
-                extracted_text += page.extract_text() + "\n"
+            extracted_text = extract_pdf_text(file_hash, file_data)
         except Exception as e:
             extracted_text = f"Fehler beim Lesen der PDF: {e}"
     elif uploaded_file.type == "application/epub+zip":
         extracted_text = "EPUB Dateien können aktuell nicht verarbeitet werden."
     else:
-        try:
-            extracted_text = uploaded_file.read().decode("utf-8")
-        except Exception as e:
-            extracted_text = f"Fehler beim Lesen der Datei: {e}"
+        extracted_text = file_data.decode("utf-8", errors="replace")
     st.markdown("**Extrahierter Text:**")
     st.text(extracted_text)
     st.text_area("Bearbeiten Sie den extrahierten Text:", value=extracted_text, key="file_text", height=150)
@@ -250,28 +627,31 @@ if uploaded_file is not None:
     st.markdown(f'<p class="estimate">Geschätzte Dauer: {format_duration(estimated_seconds)}</p>', unsafe_allow_html=True)
     st.markdown(f'<p class="estimate">Geschätzte Kosten: ${estimated_cost:.2f}</p>', unsafe_allow_html=True)
     
-    if st.button("Preis bestätigen und TTS starten"):
+    if st.button("Preis bestätigen und TTS starten", disabled=conversion_running()):
         if st.session_state.file_text.strip() == "":
             st.warning("Bitte bearbeiten Sie den Text oder laden Sie eine gültige Datei hoch.")
         else:
-            with st.spinner("Wandle Datei-Text in Sprache um..."):
-                audio_file_path = convert_text_to_speech(
-                    st.session_state.file_text,
-                    voices[selected_voice],
-                    modelle[selected_model]["model"]
-                )
-            if isinstance(audio_file_path, str) and audio_file_path.startswith("Error:"):
-                st.error(f"Ein Fehler ist aufgetreten: {audio_file_path}")
-            else:
-                st.success("Umwandlung abgeschlossen!")
-                st.audio(audio_file_path, format="audio/mp3")
-                with open(audio_file_path, "rb") as file:
-                    st.download_button(
-                        label="Audio-Datei herunterladen",
-                        data=file,
-                        file_name="tts_output.mp3",
-                        mime="audio/mp3"
-                    )
+            start_conversion(
+                "file",
+                st.session_state.file_text,
+                voices[selected_voice],
+                modelle[selected_model]["model"]
+            )
+    file_progress_placeholder = render_conversion("file")
+    if file_progress_placeholder is not None:
+        progress_placeholder = file_progress_placeholder
+else:
+    # Zwischengespeicherte Bytes einer entfernten Datei freigeben
+    st.session_state.pop("upload", None)
 
 st.markdown("</div>", unsafe_allow_html=True)
 st.markdown("Erstellt mit ❤️ unter Verwendung von Streamlit und dem OpenAI TTS-Modell")
+
+# Solange eine Umwandlung läuft, nur den Fortschrittsbalken aktualisieren; danach neu laden, um das Ergebnis anzuzeigen
+if conversion_running():
+    if progress_placeholder is not None:
+        follow_conversion(progress_placeholder)
+    else:
+        # Der auslösende Bereich ist gerade nicht sichtbar (z.B. Datei entfernt)
+        wait([st.session_state.job["future"]], timeout=PROGRESS_HEARTBEAT)
+    st.rerun()
@@ -0,0 +1,42 @@
+"""
+Parallele Textextraktion aus PDFs mit PyPDF2 (Fallback, falls pypdfium2 fehlt).
+
+Wird von buch_app.py als eigener Prozess gestartet (python -m pdf_extract): liest die PDF von stdin
+und schreibt den Text UTF-8-kodiert nach stdout. So werden die Worker weder aus dem mehrfädigen
+Streamlit-Server geforkt noch führen sie beim Start die Streamlit-App als __main__ erneut aus.
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import PyPDF2
+
+def extract_pages(args):
+    """
+    Extrahiert den Text der Seiten start bis stop (exklusiv) einer PDF.
+    Erwartet ein Tupel (data, start, stop), damit die Funktion mit Executor.map nutzbar ist.
+    """
+    data, start, stop = args
+    pdf_reader = PyPDF2.PdfReader(BytesIO(data))
+    return "".join(pdf_reader.pages[i].extract_text() + "\n" for i in range(start, stop))
+
+def extract_text(data):
+    """
+    Extrahiert den Text aller Seiten. Die Seiten werden in zusammenhängende Bereiche aufgeteilt
+    und parallel in mehreren Prozessen verarbeitet.
+    """
+    page_count = len(PyPDF2.PdfReader(BytesIO(data)).pages)
+    workers = min(os.cpu_count() or 1, page_count)
+    if workers <= 1:
+        return extract_pages((data, 0, page_count))
+    pages_per_worker = -(-page_count // workers)
+    page_ranges = [
+        (data, start, min(start + pages_per_worker, page_count))
+        for start in range(0, page_count, pages_per_worker)
+    ]
+    with ProcessPoolExecutor(max_workers=len(page_ranges)) as executor:
+        return "".join(executor.map(extract_pages, page_ranges))
+
+if __name__ == "__main__":
+    sys.stdout.buffer.write(extract_text(sys.stdin.buffer.read()).encode("utf-8"))